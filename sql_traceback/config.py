@@ -15,3 +15,7 @@ FILTER_SITEPACKAGES = _get_setting("SQL_TRACEBACK_FILTER_SITEPACKAGES", True)
 FILTER_TESTING_FRAMEWORKS = _get_setting("SQL_TRACEBACK_FILTER_TESTING_FRAMEWORKS", True)
 FILTER_STDLIB = _get_setting("SQL_TRACEBACK_FILTER_STDLIB", True)
 MIN_APP_FRAMES = _get_setting("SQL_TRACEBACK_MIN_APP_FRAMES", 1)
+MIN_SQL_LEN = _get_setting("SQL_TRACEBACK_MIN_SQL_LEN", 0)
+SAMPLE_RATE = _get_setting("SQL_TRACEBACK_SAMPLE_RATE", 1.0)
+UNFILTERED_WALK = _get_setting("SQL_TRACEBACK_UNFILTERED_WALK", False)
+EXECUTEMANY_THRESHOLD = _get_setting("SQL_TRACEBACK_EXECUTEMANY_THRESHOLD", 16)
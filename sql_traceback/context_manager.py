@@ -27,30 +27,83 @@ Configuration in settings.py:
     SQL_TRACEBACK_FILTER_TESTING_FRAMEWORKS = True  # Filter out pytest/unittest frames (default: True)
     SQL_TRACEBACK_FILTER_STDLIB = True  # Filter out Python standard library frames (default: True)
     SQL_TRACEBACK_MIN_APP_FRAMES = 1  # Minimum application frames required (default: 1)
+    SQL_TRACEBACK_MIN_SQL_LEN = 0  # Skip statements shorter than this many characters (default: 0)
+    SQL_TRACEBACK_SAMPLE_RATE = 1.0  # Fraction of queries to annotate (default: 1.0)
+    SQL_TRACEBACK_UNFILTERED_WALK = False  # Emit the most recent frames without filtering (default: False)
+    SQL_TRACEBACK_EXECUTEMANY_THRESHOLD = 16  # Don't annotate executemany batches larger than this (default: 16)
 """
 
+from __future__ import annotations
+
 import contextlib
 import functools
-import types
-from collections.abc import Callable
-from typing import Any, Protocol
+import threading
+from typing import TYPE_CHECKING, Any
 
 from django.db import connection
-from django.db.backends.utils import CursorDebugWrapper
 
-from sql_traceback.cursors import StacktraceCursorWrapper, StacktraceDebugCursorWrapper
+from sql_traceback import parser
+from sql_traceback.cursors import patch_cursor
+
+if TYPE_CHECKING:
+    import types
+    from collections.abc import Callable
+    from typing import Protocol
+
+    class CursorProtocol(Protocol):
+        """Protocol for cursor-like objects."""
+
+        def execute(self, sql: str, params: Any = None) -> Any: ...
+        def executemany(self, sql: str, param_list: list[Any]) -> Any: ...
+        def fetchone(self) -> Any: ...
+        def fetchmany(self, size: int = ...) -> list[Any]: ...
+        def fetchall(self) -> list[Any]: ...
+
 
 __all__ = ["sql_traceback", "SqlTraceback"]
 
+# Nesting depth of active context managers, kept thread-local so concurrent
+# threads tracing independently don't fight over the patch
+_patch_state = threading.local()
+
+
+def _patch_connection() -> None:
+    """Install the cursor patch, counting nested entries.
+
+    Only the outermost entry installs the patch; nested ``sql_traceback`` /
+    ``SqlTraceback`` blocks just bump the depth counter. Without this, each
+    nesting level would wrap the already-patched cursor method again, stacking
+    wrappers and leaking the patch if the levels exit out of order.
+    """
+    depth = getattr(_patch_state, "depth", 0)
+    _patch_state.depth = depth + 1
+    if depth:
+        return
+
+    # Save original cursor method
+    original_cursor = connection.cursor
+    _patch_state.original_cursor = original_cursor
+
+    # Define patched cursor method
+    @functools.wraps(original_cursor)
+    def cursor_with_stacktrace(*args: Any, **kwargs: Any) -> Any:
+        # Works for plain and debug cursors alike - the original bound
+        # methods (and their logging) are called underneath
+        return patch_cursor(original_cursor(*args, **kwargs))
+
+    # Apply cursor patch
+    connection.cursor = cursor_with_stacktrace  # pyright: ignore[reportGeneralTypeIssues]
 
-class CursorProtocol(Protocol):
-    """Protocol for cursor-like objects."""
 
-    def execute(self, sql: str, params: Any = None) -> Any: ...
-    def executemany(self, sql: str, param_list: list[Any]) -> Any: ...
-    def fetchone(self) -> Any: ...
-    def fetchmany(self, size: int = ...) -> list[Any]: ...
-    def fetchall(self) -> list[Any]: ...
+def _unpatch_connection() -> None:
+    """Undo one level of nesting, restoring the cursor on the outermost exit."""
+    depth = getattr(_patch_state, "depth", 0)
+    if depth <= 0:
+        return
+    _patch_state.depth = depth - 1
+    if depth == 1:
+        connection.cursor = _patch_state.original_cursor  # pyright: ignore[reportGeneralTypeIssues]
+        _patch_state.original_cursor = None
 
 
 @contextlib.contextmanager
@@ -67,6 +120,10 @@ def sql_traceback():
         SQL_TRACEBACK_FILTER_TESTING_FRAMEWORKS: Filter out pytest/unittest frames (default: True)
         SQL_TRACEBACK_FILTER_STDLIB: Filter out Python standard library frames (default: True)
         SQL_TRACEBACK_MIN_APP_FRAMES: Minimum application frames required (default: 1)
+        SQL_TRACEBACK_MIN_SQL_LEN: Skip statements shorter than this many characters (default: 0)
+        SQL_TRACEBACK_SAMPLE_RATE: Fraction of queries to annotate (default: 1.0)
+        SQL_TRACEBACK_UNFILTERED_WALK: Emit the most recent frames without filtering (default: False)
+        SQL_TRACEBACK_EXECUTEMANY_THRESHOLD: Don't annotate executemany batches larger than this (default: 16)
 
     Examples:
         >>> from sql_traceback import sql_traceback
@@ -83,26 +140,17 @@ def sql_traceback():
         >>>         with sql_traceback(), self.assertNumQueries(1):
         >>>             User.objects.first()
     """
-    # Save original cursor method
-    original_cursor = connection.cursor
-
-    # Define patched cursor method
-    @functools.wraps(original_cursor)
-    def cursor_with_stacktrace(*args: Any, **kwargs: Any) -> Any:
-        cursor = original_cursor(*args, **kwargs)
-
-        # If Django is in debug mode, it will use CursorDebugWrapper
-        if isinstance(cursor, CursorDebugWrapper):
-            return StacktraceDebugCursorWrapper(cursor.cursor, cursor.db)
-        return StacktraceCursorWrapper(cursor, connection)
+    # When disabled there is nothing to annotate, so don't pay for the
+    # cursor patch or the wrapper objects at all
+    if not parser.TRACEBACK_ENABLED:
+        yield
+        return
 
+    _patch_connection()
     try:
-        # Apply cursor patch
-        connection.cursor = cursor_with_stacktrace  # pyright: ignore[reportGeneralTypeIssues]
         yield
     finally:
-        # Restore original cursor method
-        connection.cursor = original_cursor  # pyright: ignore[reportGeneralTypeIssues]
+        _unpatch_connection()
 
 
 class SqlTraceback:
@@ -118,6 +166,10 @@ class SqlTraceback:
         SQL_TRACEBACK_FILTER_TESTING_FRAMEWORKS: Filter out pytest/unittest frames (default: True)
         SQL_TRACEBACK_FILTER_STDLIB: Filter out Python standard library frames (default: True)
         SQL_TRACEBACK_MIN_APP_FRAMES: Minimum application frames required (default: 1)
+        SQL_TRACEBACK_MIN_SQL_LEN: Skip statements shorter than this many characters (default: 0)
+        SQL_TRACEBACK_SAMPLE_RATE: Fraction of queries to annotate (default: 1.0)
+        SQL_TRACEBACK_UNFILTERED_WALK: Emit the most recent frames without filtering (default: False)
+        SQL_TRACEBACK_EXECUTEMANY_THRESHOLD: Don't annotate executemany batches larger than this (default: 16)
 
     Examples:
         >>> from sql_traceback import SqlTraceback
@@ -133,26 +185,18 @@ class SqlTraceback:
     """
 
     def __init__(self):
-        self._original_cursor: Callable[..., Any] | None = None
+        # Levels this instance has entered; an instance can be reused (e.g.
+        # as a decorator on a recursive function)
+        self._entered = 0
 
     def __enter__(self):
-        # Save original cursor method
-        self._original_cursor = connection.cursor
-
-        # Define patched cursor method
-        def cursor_with_stacktrace(*args: Any, **kwargs: Any) -> Any:
-            if self._original_cursor is None:
-                return connection.cursor(*args, **kwargs)
-
-            cursor = self._original_cursor(*args, **kwargs)
-
-            # If Django is in debug mode, it will use CursorDebugWrapper
-            if isinstance(cursor, CursorDebugWrapper):
-                return StacktraceDebugCursorWrapper(cursor.cursor, cursor.db)
-            return StacktraceCursorWrapper(cursor, connection)
+        # When disabled, skip the cursor patch entirely; __exit__ checks the
+        # counter so it stays safe either way
+        if not parser.TRACEBACK_ENABLED:
+            return self
 
-        # Apply cursor patch
-        connection.cursor = cursor_with_stacktrace  # pyright: ignore[reportGeneralTypeIssues]
+        _patch_connection()
+        self._entered += 1
         return self
 
     def __exit__(
@@ -161,13 +205,11 @@ class SqlTraceback:
         exc_val: BaseException | None,
         exc_tb: types.TracebackType | None,
     ) -> bool:
-        # Restore original cursor method even if an exception occurred
-        try:
-            if hasattr(self, "_original_cursor") and self._original_cursor is not None:
-                connection.cursor = self._original_cursor  # pyright: ignore[reportGeneralTypeIssues]
-        finally:
-            # Always reset the stored reference
-            self._original_cursor = None
+        # Undo our nesting level even if an exception occurred; the shared
+        # counter restores the original cursor on the outermost exit
+        if self._entered:
+            self._entered -= 1
+            _unpatch_connection()
 
         # Don't suppress exceptions
         return False
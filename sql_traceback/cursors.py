@@ -1,35 +1,65 @@
-from collections.abc import Mapping, Sequence
-from typing import Any
+"""Cursor-level patching that annotates executed SQL with stacktraces.
 
-from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
-from sql_traceback.parser import add_stacktrace_to_query
+Large ``executemany`` batches are deliberately not annotated (see
+``SQL_TRACEBACK_EXECUTEMANY_THRESHOLD``): the statement is sent once for many
+rows, so the comment adds little diagnostic value, and a varying comment
+string makes each batch look like a new statement to server-side
+prepared-statement caches.
 
+Annotation happens here, at the cursor's outermost execute methods, rather
+than through Django's ``connection.execute_wrapper`` hook. That hook runs
+below ``CursorDebugWrapper``, which logs the SQL it was originally handed -
+so a wrapper-based implementation would send annotated SQL to the database
+but leave ``connection.queries`` (and ``assertNumQueries`` captures) without
+the stacktrace. Patching the bound methods keeps the annotation visible in
+both places.
+"""
 
-class StacktraceCursorWrapper(CursorWrapper):
-    """A cursor wrapper that adds stacktrace comments to executed SQL queries."""
+import functools
+from collections.abc import Callable, Mapping, Sequence
+from typing import Any
 
-    def __init__(self, cursor: Any, db: Any) -> None:
-        super().__init__(cursor, db)  # pyright: ignore[reportArgumentType]
+from sql_traceback import parser
+from sql_traceback.config import EXECUTEMANY_THRESHOLD
+from sql_traceback.parser import add_stacktrace_to_query
 
-    def execute(self, sql: str, params: Any = None) -> Any:
-        modified_sql = add_stacktrace_to_query(sql)
-        return super().execute(modified_sql, params)
 
-    def executemany(self, sql: str, param_list: Sequence[Sequence[Any] | Mapping[str, Any] | None]) -> Any:
-        modified_sql = add_stacktrace_to_query(sql)
-        return super().executemany(modified_sql, param_list)
+# The annotate function is bound as a default argument so each call loads it
+# from the fast locals instead of resolving a module global per query.
+def _traced_execute(
+    real_execute: Callable[..., Any],
+    sql: str,
+    params: Any = None,
+    _annotate: Callable[[str], str] = add_stacktrace_to_query,
+) -> Any:
+    if parser.TRACEBACK_ENABLED:
+        sql = _annotate(sql)
+    return real_execute(sql, params)
 
 
-class StacktraceDebugCursorWrapper(CursorDebugWrapper):
-    """A debug cursor wrapper that adds stacktrace comments to executed SQL queries."""
+def _traced_executemany(
+    real_executemany: Callable[..., Any],
+    sql: str,
+    param_list: Sequence[Sequence[Any] | Mapping[str, Any] | None],
+    _annotate: Callable[[str], str] = add_stacktrace_to_query,
+) -> Any:
+    # Skip annotation for parameter-heavy batches; sized containers only -
+    # iterators pass through annotated rather than being consumed to count
+    if parser.TRACEBACK_ENABLED and not (hasattr(param_list, "__len__") and len(param_list) > EXECUTEMANY_THRESHOLD):
+        sql = _annotate(sql)
+    return real_executemany(sql, param_list)
 
-    def __init__(self, cursor: Any, db: Any) -> None:
-        super().__init__(cursor, db)  # pyright: ignore[reportArgumentType]
 
-    def execute(self, sql: str, params: Any = None) -> Any:
-        modified_sql = add_stacktrace_to_query(sql)
-        return super().execute(modified_sql, params)
+def patch_cursor(cursor: Any) -> Any:
+    """Patch a cursor's execute methods in place to annotate SQL with stacktraces.
 
-    def executemany(self, sql: str, param_list: Sequence[Sequence[Any] | Mapping[str, Any] | None]) -> Any:
-        modified_sql = add_stacktrace_to_query(sql)
-        return super().executemany(modified_sql, param_list)
+    Django apps open many short-lived cursors, so replacing the two bound
+    methods is cheaper than allocating a wrapper object per cursor. It also
+    keeps the cursor's own class - including CursorDebugWrapper's query
+    logging - intact, since the original bound method is called underneath.
+    """
+    # The original bound methods are captured in the partials here, once per
+    # cursor, so the per-query path does no attribute lookups on the cursor
+    cursor.execute = functools.partial(_traced_execute, cursor.execute)
+    cursor.executemany = functools.partial(_traced_executemany, cursor.executemany)
+    return cursor
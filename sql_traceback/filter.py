@@ -4,7 +4,12 @@ This module contains functions for filtering and sanitizing stack frames
 to produce clean, readable stacktraces that focus on application code.
 """
 
+import functools
+import re
 import traceback
+from typing import Any
+
+from django.core.signals import setting_changed
 
 from sql_traceback.config import (
     FILTER_SITEPACKAGES,
@@ -12,7 +17,81 @@ from sql_traceback.config import (
     FILTER_TESTING_FRAMEWORKS,
 )
 
-__all__ = ["should_include_frame", "sanitize_filename"]
+__all__ = ["should_include_frame", "should_include_filename", "sanitize_filename"]
+
+
+def _compile_patterns(patterns: list[str]) -> re.Pattern[str]:
+    """Compile a list of literal substrings into one alternation pattern."""
+    return re.compile("|".join(map(re.escape, patterns)))
+
+
+# The exclude lists are import-time constants, so fold each group into a
+# single compiled pattern: one C-level scan per group instead of a chain of
+# Python-level substring checks rebuilt on every call.
+
+# Third-party / framework code (applied when FILTER_SITEPACKAGES is on):
+# Django itself, Django management commands (manage.py and related), and
+# this package's own internal files. Windows variants cover both separators.
+_SITEPACKAGES_EXCLUDE_RE = _compile_patterns(
+    [
+        "/django/",
+        "\\django\\",
+        "/manage.py",
+        "\\manage.py",
+        "/django/core/management/",
+        "\\django\\core\\management\\",
+        "/sql_traceback/cursors.py",
+        "\\sql_traceback\\cursors.py",
+        "/sql_traceback/parser.py",
+        "\\sql_traceback\\parser.py",
+    ]
+)
+
+# Python standard library modules (applied when FILTER_STDLIB is on and the
+# path is not under site-packages)
+_STDLIB_EXCLUDE_RE = _compile_patterns(
+    [
+        "/lib/python3.",
+        "/lib64/python3.",
+        "<frozen ",
+        "/runpy.py",
+        "/threading.py",
+        "/queue.py",
+        "/contextlib.py",
+        "/functools.py",
+        "/traceback.py",
+        "/inspect.py",
+        "/importlib/",
+        "/collections/",
+        "/weakref.py",
+        "/copy.py",
+        "/logging/",
+    ]
+)
+
+# Testing framework internals and entry points (applied when
+# FILTER_TESTING_FRAMEWORKS is on): pytest internals, pytest executables
+# (lowercased for case-insensitive matching) and unittest internals.
+# User test files are deliberately not matched.
+_TESTING_EXCLUDE_RE = _compile_patterns(
+    [
+        "_pytest/",
+        "pytest_django/",
+        "/pluggy/",
+        "/bin/pytest",
+        "/scripts/pytest.exe",
+        "\\scripts\\pytest.exe",
+        "unittest/case.py",
+        "unittest/loader.py",
+        "unittest/runner.py",
+        "unittest/suite.py",
+        "unittest/main.py",
+    ]
+)
+
+
+# Characters/sequences that could break out of the SQL comment block
+_SANITIZE_RE = re.compile(r"\*/|/\*|[\n\r]")
 
 
 def sanitize_filename(filename: str) -> str:
@@ -24,7 +103,11 @@ def sanitize_filename(filename: str) -> str:
     Returns:
         A sanitized filename safe to include in SQL comments
     """
-    return filename.replace("*/", "").replace("/*", "").replace("\n", "").replace("\r", "")
+    # Realistic filenames never contain comment delimiters or newlines, so in
+    # the common case a single scan confirms there is nothing to strip
+    if _SANITIZE_RE.search(filename) is None:
+        return filename
+    return _SANITIZE_RE.sub("", filename)
 
 
 def should_include_frame(frame: traceback.FrameSummary) -> bool:
@@ -36,97 +119,73 @@ def should_include_frame(frame: traceback.FrameSummary) -> bool:
     Returns:
         True if the frame should be included in the stacktrace, False otherwise
     """
-    filename_lower = frame.filename.lower()
+    return should_include_filename(frame.filename)
+
+
+def should_include_filename(filename: str) -> bool:
+    """Determine if frames from a source file should be included in the traceback.
+
+    The decision is pure per filename and filter settings, and the same small
+    set of filenames recurs on every query, so the actual check is memoized.
+
+    Args:
+        filename: The source filename of the frame to evaluate
+
+    Returns:
+        True if frames from this file should be included, False otherwise
+    """
+    # The cache is keyed on the raw filename: co_filename strings are shared
+    # per code object, so repeat frames hit the cache without paying for the
+    # lowercase copy, which is only made on a miss. The filter settings take
+    # part in the key so tests (or runtime patching) that flip them never see
+    # stale decisions.
+    return _filename_included(
+        filename,
+        FILTER_SITEPACKAGES,
+        FILTER_STDLIB,
+        FILTER_TESTING_FRAMEWORKS,
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _filename_included(
+    filename: str,
+    filter_sitepackages: bool,
+    filter_stdlib: bool,
+    filter_testing_frameworks: bool,
+) -> bool:
+    """Decide whether frames from a file should be included (cached)."""
+    filename_lower = filename.lower()
 
     # Skip shell execution frames (like from Django shell commands)
-    if frame.filename.startswith("<") and frame.filename.endswith(">"):
+    if filename_lower.startswith("<") and filename_lower.endswith(">"):
+        return False
+
+    # Skip third-party packages, Django framework code, management commands
+    # and this package's own internals if filtering is enabled
+    if filter_sitepackages and ("site-packages/" in filename_lower or _SITEPACKAGES_EXCLUDE_RE.search(filename_lower)):
+        return False
+
+    # Skip Python standard library modules (not in site-packages) if filtering is enabled
+    if filter_stdlib and "site-packages/" not in filename_lower and _STDLIB_EXCLUDE_RE.search(filename_lower):
         return False
 
-    if FILTER_SITEPACKAGES:
-        if "site-packages/" in filename_lower:
-            return False
-        # Skip Django management commands (manage.py and related)
-        management_patterns = [
-            "/manage.py",
-            "\\manage.py",  # Windows path separator
-            "/django/core/management/",
-            "\\django\\core\\management\\",  # Windows path separator
-        ]
-
-        # Skip this package's own internal files
-        package_internals = [
-            "/sql_traceback/cursors.py",
-            "\\sql_traceback\\cursors.py",  # Windows path separator
-            "/sql_traceback/parser.py",
-            "\\sql_traceback\\parser.py",  # Windows path separator
-        ]
-
-        # Skip Django framework code if filtering is enabled
-        django_patterns = [
-            "/django/",
-            "\\django\\",  # Windows path separator
-        ]
-        if any(pattern in filename_lower for pattern in django_patterns + package_internals + management_patterns):
-            return False
-
-    # Skip Python standard library if filtering is enabled
-    if FILTER_STDLIB:
-        # Filter Python standard library modules
-        stdlib_patterns = [
-            "/lib/python3.",
-            "/lib64/python3.",
-            "<frozen ",
-            "/runpy.py",
-            "/threading.py",
-            "/queue.py",
-            "/contextlib.py",
-            "/functools.py",
-            "/traceback.py",
-            "/inspect.py",
-            "/importlib/",
-            "/collections/",
-            "/weakref.py",
-            "/copy.py",
-            "/logging/",
-        ]
-
-        # Check if it's a stdlib module (not in site-packages)
-        if "site-packages/" not in filename_lower and any(pattern in filename_lower for pattern in stdlib_patterns):
-            return False
-
-    # Skip testing framework internals if filtering is enabled
-    # This is useful because testing frameworks span both third-party (pytest) and stdlib (unittest)
-    # and you almost never want to see their internals when debugging SQL queries
-    if FILTER_TESTING_FRAMEWORKS:
-        # Filter pytest internals (third-party)
-        pytest_excludes = [
-            "_pytest/",
-            "pytest_django/",
-            "/pluggy/",
-        ]
-
-        # Filter pytest executables - these are entry points, not useful for SQL debugging
-        pytest_executable_excludes = [
-            "/bin/pytest",
-            "/scripts/pytest.exe",  # Windows (lowercased for case-insensitive matching)
-            "\\scripts\\pytest.exe",  # Windows with backslashes (lowercased)
-        ]
-
-        # Filter unittest internals (stdlib)
-        unittest_excludes = [
-            "unittest/case.py",
-            "unittest/loader.py",
-            "unittest/runner.py",
-            "unittest/suite.py",
-            "unittest/main.py",
-        ]
-
-        # Combine all testing framework excludes
-        testing_excludes = pytest_excludes + pytest_executable_excludes + unittest_excludes
-
-        # Don't filter out user test files - only internal framework files
-        if any(exclude in filename_lower for exclude in testing_excludes):
-            return False
-
-    # Include everything else (application code including user test files)
-    return True
+    # Skip testing framework internals if filtering is enabled - testing
+    # frameworks span both third-party (pytest) and stdlib (unittest) and you
+    # almost never want their internals when debugging SQL queries. Everything
+    # else (application code including user test files) is included.
+    return not (filter_testing_frameworks and _TESTING_EXCLUDE_RE.search(filename_lower))
+
+
+def _clear_filename_cache(sender: Any, setting: str, **kwargs: Any) -> None:
+    """Drop cached inclusion decisions when a package setting changes.
+
+    The filter flags take part in the cache key, so stale hits are already
+    impossible; clearing just stops entries for the old flag values from
+    occupying cache slots (e.g. across override_settings in test suites).
+    """
+    if setting.startswith("SQL_TRACEBACK_"):
+        _filename_included.cache_clear()
+
+
+setting_changed.connect(_clear_filename_cache)
@@ -1,12 +1,56 @@
-import traceback
-
+import contextlib
+import functools
+import random
+import sys
+from types import FrameType
 
 from sql_traceback.config import (
     MAX_STACK_FRAMES,
     MIN_APP_FRAMES,
+    MIN_SQL_LEN,
+    SAMPLE_RATE,
     TRACEBACK_ENABLED,
+    UNFILTERED_WALK,
 )
-from sql_traceback.filter import sanitize_filename, should_include_frame
+from sql_traceback.filter import sanitize_filename, should_include_filename
+
+# Extra frames to walk beyond MAX_STACK_FRAMES so that frames discarded by
+# the filter don't leave us short, without walking the whole stack every time.
+FILTER_HEADROOM = 32
+
+# How many of the most recent raw frames to keep for the fallback note when
+# filtering leaves too few application frames
+_FALLBACK_FRAMES = 3
+
+# Transaction-control statements Django issues internally (BEGIN, COMMIT,
+# SAVEPOINT and friends); annotating them burns a stack walk and inflates the
+# SQL for zero debugging value. Compared against the first 9 characters
+# uppercased, so each prefix must be at most 9 characters long.
+_CONTROL_PREFIXES = (
+    "BEGIN",
+    "COMMIT",
+    "ROLLBACK",
+    "SAVEPOINT",
+    "RELEASE S",  # RELEASE SAVEPOINT
+    "SET AUTOC",  # SET AUTOCOMMIT
+)
+
+# Constant pieces of the appended comment, assembled with a single join on
+# the hot path instead of re-parsing an f-string template per query
+_COMMENT_PREFIX = "\n/*\nSTACKTRACE:\n"
+_COMMENT_SUFFIX = "\n*/"
+
+# Prebound formatter for one stacktrace line
+_FRAME_FMT = "# {}:{} in {}".format
+
+# Dedicated generator for sampling decisions, with its random() method
+# prebound so the sampled path is a single call
+_sample = random.Random().random
+
+# How many bytes of the SQL tail to scan for an existing stacktrace marker.
+# The comment is always appended at the end, so there is no need to scan the
+# body of huge statements (e.g. bulk INSERTs).
+_MARKER_SCAN_WINDOW = 4096
 
 
 def _is_stacktrace_enabled() -> bool:
@@ -14,6 +58,83 @@ def _is_stacktrace_enabled() -> bool:
     return bool(TRACEBACK_ENABLED)
 
 
+def _walk_frames(
+    limit: int,
+    max_included: int,
+) -> tuple[list[tuple[str, int, str]], list[tuple[str, int, str]], FrameType | None]:
+    """Walk the stack, filtering as it goes, until enough frames are included.
+
+    Walks raw frame objects via ``f_back`` instead of ``traceback.extract_stack``,
+    which would also resolve source lines through ``linecache`` (a stat() per
+    frame) even though we only ever emit filename, line number and name.
+    Applying the filter during the walk means the walk stops as soon as
+    ``max_included`` application frames are found, instead of collecting and
+    filtering frames that would be sliced away anyway.
+
+    Modules that set a truthy module-level ``__traceback_hide__`` (the
+    Django/IPython convention) are skipped as well - a single dict lookup on
+    ``f_globals`` per frame, deliberately not the per-frame ``f_locals``
+    variant, since materializing the locals mapping would cost more than the
+    filtering saves.
+
+    Returns the included frames (most recent first), the first few raw frames
+    for the fallback note, and the first frame that was *not* walked (``None``
+    when the stack was exhausted) so the caller can resume the walk if it
+    turns out more frames are needed.
+    """
+    included: list[tuple[str, int, str]] = []
+    head: list[tuple[str, int, str]] = []
+    walked = 0
+    # Frame 0 is this function, frame 1 is add_stacktrace_to_query; start above both
+    f = sys._getframe(2)
+    while f is not None and len(included) < max_included and walked < limit:
+        code = f.f_code
+        entry = (code.co_filename, f.f_lineno, code.co_name)
+        if walked < _FALLBACK_FRAMES:
+            head.append(entry)
+        if should_include_filename(code.co_filename) and not f.f_globals.get("__traceback_hide__"):
+            included.append(entry)
+        f = f.f_back
+        walked += 1
+    return included, head, f
+
+
+@functools.lru_cache(maxsize=1024)
+def _format_stack_comment(frames: tuple[tuple[str, int, str], ...]) -> str:
+    """Format already-filtered frames into comment lines, cached per call site.
+
+    Within a loop issuing queries, every iteration produces the identical
+    frame tuple, so the sanitizing and joining can be reused wholesale.
+    """
+    # Frames arrive most-recent-first; emit them oldest-first. Building the
+    # lines inside the join avoids the per-iteration append dispatch of an
+    # explicit loop.
+    return "\n".join(
+        _FRAME_FMT(sanitize_filename(filename), lineno, name) for filename, lineno, name in reversed(frames)
+    )
+
+
+def _should_skip(sql: str) -> bool:
+    """Decide whether a statement should be returned unannotated.
+
+    Groups the cheap early-exit guards that run before any frame work:
+
+    - Probabilistic sampling: with SQL_TRACEBACK_SAMPLE_RATE below 1.0 only
+      that fraction of queries is annotated - a random sample is usually
+      enough to locate an offending call site at a fraction of the overhead.
+    - Statements below the configured size and transaction-control
+      statements - neither is worth a stack walk or the comment bloat.
+    - An already-present stacktrace. It is always appended at the end, so a
+      bounded scan of the tail is enough - no need to walk the whole string
+      for large statements.
+    """
+    if SAMPLE_RATE < 1.0 and _sample() >= SAMPLE_RATE:
+        return True
+    if len(sql) < MIN_SQL_LEN or sql[:9].upper().startswith(_CONTROL_PREFIXES):
+        return True
+    return sql.endswith("*/") and sql.rfind("\nSTACKTRACE:\n", max(0, len(sql) - _MARKER_SCAN_WINDOW)) != -1
+
+
 def add_stacktrace_to_query(sql: str) -> str:
     """Add the current Python stacktrace to a SQL query as a comment.
 
@@ -24,40 +145,69 @@ def add_stacktrace_to_query(sql: str) -> str:
         The SQL query with a stacktrace comment appended, or the original
         SQL if stacktracing is disabled or already present.
     """
-    # Early return if disabled or already has stacktrace
-    if not _is_stacktrace_enabled() or "/*\nSTACKTRACE:" in sql:
+    # Early return if disabled, sampled out, not worth annotating, or
+    # already annotated
+    if not TRACEBACK_ENABLED or _should_skip(sql):
         return sql
 
     try:
-        # Get the current stacktrace
-        stack = traceback.extract_stack()
+        # Opt-in fast path (auto-enabled for very small frame budgets) for
+        # users who know their call depth: take the most recent frames
+        # verbatim and skip the filter entirely
+        if UNFILTERED_WALK or MAX_STACK_FRAMES <= 3:
+            raw: list[tuple[str, int, str]] = []
+            f_raw: FrameType | None = sys._getframe(1)
+            while f_raw is not None and len(raw) < MAX_STACK_FRAMES:
+                code = f_raw.f_code
+                raw.append((code.co_filename, f_raw.f_lineno, code.co_name))
+                f_raw = f_raw.f_back
+            return "".join((sql, _COMMENT_PREFIX, _format_stack_comment(tuple(raw)), _COMMENT_SUFFIX))
 
-        # Filter out framework and library calls to focus on application code
-        filtered_stack = [frame for frame in stack if should_include_frame(frame)]
+        # Walk and filter in one pass, stopping as soon as MAX_STACK_FRAMES
+        # application frames are found
+        included, head, rest = _walk_frames(MAX_STACK_FRAMES + FILTER_HEADROOM, MAX_STACK_FRAMES)
 
-        # Format the stacktrace into a SQL comment
-        stacktrace_lines = []
+        # If the limited walk was mostly filtered away, the application frames
+        # may be deeper in the stack - resume walking the remainder
+        if len(included) < MIN_APP_FRAMES and rest is not None:
+            f = rest
+            while f is not None and len(included) < MAX_STACK_FRAMES:
+                code = f.f_code
+                if should_include_filename(code.co_filename) and not f.f_globals.get("__traceback_hide__"):
+                    included.append((code.co_filename, f.f_lineno, code.co_name))
+                f = f.f_back
 
-        # Use configurable number of most recent frames for better context
-        if filtered_stack and len(filtered_stack) >= MIN_APP_FRAMES:
-            for frame in filtered_stack[-MAX_STACK_FRAMES:]:
-                safe_filename = sanitize_filename(frame.filename)
-                stacktrace_lines.append(f"# {safe_filename}:{frame.lineno} in {frame.name}")
+        if included and len(included) >= MIN_APP_FRAMES:
+            # Format the frames, cached per call site - repeated queries from
+            # the same loop reuse the formatted comment wholesale
+            stacktrace_comment = _format_stack_comment(tuple(included))
         else:
             # If insufficient application frames found, include a minimal note
             # but avoid returning original SQL to ensure tests can detect stacktrace presence
-            stacktrace_lines.append("# [Application frames filtered - showing remaining frames]")
-            # Include any remaining frames that weren't filtered
-            for frame in stack[-min(3, len(stack)) :]:
-                safe_filename = sanitize_filename(frame.filename)
-                stacktrace_lines.append(f"# {safe_filename}:{frame.lineno} in {frame.name}")
-
-        stacktrace_comment = "\n".join(stacktrace_lines)
+            # Include the most recent raw frames, oldest-first
+            stacktrace_comment = "\n".join(
+                (
+                    "# [Application frames filtered - showing remaining frames]",
+                    *(
+                        _FRAME_FMT(sanitize_filename(filename), lineno, name)
+                        for filename, lineno, name in reversed(head)
+                    ),
+                )
+            )
 
         # Append the stacktrace comment to the SQL query
-        return f"{sql}\n/*\nSTACKTRACE:\n{stacktrace_comment}\n*/"
+        return "".join((sql, _COMMENT_PREFIX, stacktrace_comment, _COMMENT_SUFFIX))
 
     except Exception:
         # If stacktrace extraction fails, return original SQL
         # Silently fail to avoid breaking the application
         return sql
+
+
+# An optional compiled implementation may shadow the pure-Python hot path.
+# No extension ships with this package; the hook exists so a compiled
+# sql_traceback._accel module (e.g. a Cython or C build of
+# add_stacktrace_to_query) can be dropped in without touching callers, which
+# always import the name from this module.
+with contextlib.suppress(ImportError):
+    from sql_traceback._accel import add_stacktrace_to_query as add_stacktrace_to_query
@@ -65,6 +65,65 @@ class TestCoreFunctionality(TestCase):
             result = add_stacktrace_to_query("   \n\t  ")
             self.assertIn("STACKTRACE:", result, "Should add stacktrace to whitespace-only string")
 
+    def test_existing_stacktrace_short_circuits(self):
+        """Test that already-annotated SQL is returned before any frame work happens."""
+        with (
+            patch("sql_traceback.parser.TRACEBACK_ENABLED", True),
+            patch("sql_traceback.parser._format_stack_comment") as mock_format,
+        ):
+            from sql_traceback.parser import add_stacktrace_to_query
+
+            sql_with_stacktrace = "SELECT * FROM users\n/*\nSTACKTRACE:\n# existing\n*/"
+            result = add_stacktrace_to_query(sql_with_stacktrace)
+            self.assertEqual(result, sql_with_stacktrace, "Should return annotated SQL unchanged")
+            mock_format.assert_not_called()
+
+    def test_control_statements_not_annotated(self):
+        """Test that transaction-control statements are left untouched."""
+        with patch("sql_traceback.parser.TRACEBACK_ENABLED", True):
+            from sql_traceback.parser import add_stacktrace_to_query
+
+            for sql in ["BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT s1", "RELEASE SAVEPOINT s1"]:
+                result = add_stacktrace_to_query(sql)
+                self.assertEqual(result, sql, f"Should not annotate control statement {sql!r}")
+
+    def test_min_sql_len_setting(self):
+        """Test that statements below SQL_TRACEBACK_MIN_SQL_LEN are skipped."""
+        with patch("sql_traceback.parser.TRACEBACK_ENABLED", True), patch("sql_traceback.parser.MIN_SQL_LEN", 32):
+            from sql_traceback.parser import add_stacktrace_to_query
+
+            short_sql = "SELECT 1"
+            self.assertEqual(add_stacktrace_to_query(short_sql), short_sql, "Should skip short statements")
+
+            long_sql = "SELECT id, name FROM users WHERE is_active = 1"
+            self.assertIn("STACKTRACE:", add_stacktrace_to_query(long_sql), "Should annotate longer statements")
+
+    def test_sample_rate_setting(self):
+        """Test that SQL_TRACEBACK_SAMPLE_RATE controls how often queries are annotated."""
+        with patch("sql_traceback.parser.TRACEBACK_ENABLED", True):
+            from sql_traceback.parser import add_stacktrace_to_query
+
+            sql = "SELECT * FROM users"
+
+            # A rate of 0.0 never annotates
+            with patch("sql_traceback.parser.SAMPLE_RATE", 0.0):
+                for _ in range(10):
+                    self.assertEqual(add_stacktrace_to_query(sql), sql, "Should never annotate at rate 0.0")
+
+            # The default rate of 1.0 always annotates
+            with patch("sql_traceback.parser.SAMPLE_RATE", 1.0):
+                self.assertIn("STACKTRACE:", add_stacktrace_to_query(sql), "Should always annotate at rate 1.0")
+
+    def test_unfiltered_walk_setting(self):
+        """Test the SQL_TRACEBACK_UNFILTERED_WALK fast path."""
+        with patch("sql_traceback.parser.TRACEBACK_ENABLED", True), patch("sql_traceback.parser.UNFILTERED_WALK", True):
+            from sql_traceback.parser import add_stacktrace_to_query
+
+            result = add_stacktrace_to_query("SELECT * FROM users")
+            self.assertIn("STACKTRACE:", result, "Should add stacktrace in unfiltered mode")
+            # The walk starts at the caller, so this test file is the most recent frame
+            self.assertIn("test_core_functionality.py", result)
+
     def test_multiline_sql_handling(self):
         """Test handling of multiline SQL queries."""
         with patch("sql_traceback.parser.TRACEBACK_ENABLED", True):
@@ -133,6 +192,24 @@ class TestCoreFunctionality(TestCase):
         # This test mainly ensures the context manager doesn't crash
         self.assertTrue(True, "Context manager should work even when DEBUG=False")
 
+    def test_executemany_threshold(self):
+        """Test that large executemany batches are not annotated."""
+        connection.queries_log.clear()
+
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS executemany_test (value INTEGER)")
+
+        with sql_traceback(), connection.cursor() as cursor:
+            # Small batch: annotated as usual
+            cursor.executemany("INSERT INTO executemany_test (value) VALUES (%s)", [(i,) for i in range(3)])
+            # Batch above the default threshold of 16: left untouched
+            cursor.executemany("INSERT INTO executemany_test (value) VALUES (%s)", [(i,) for i in range(50)])
+
+        small_batch = connection.queries[-2]["sql"]
+        large_batch = connection.queries[-1]["sql"]
+        self.assertIn("STACKTRACE:", small_batch, "Small batches should be annotated")
+        self.assertNotIn("STACKTRACE:", large_batch, "Large batches should not be annotated")
+
     def test_nested_context_manager_safety(self):
         """Test that nested context managers are safe and don't interfere."""
         connection.queries_log.clear()
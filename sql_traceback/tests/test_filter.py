@@ -7,7 +7,6 @@ from sql_traceback import sql_traceback
 from sql_traceback.filter import should_include_frame
 
 
-@override_settings(DEBUG=True)
 class TestStacktraceFiltering(TestCase):
     """Test stacktrace filtering logic and frame inclusion/exclusion.
 
@@ -16,10 +15,26 @@ class TestStacktraceFiltering(TestCase):
     - Site-packages filtering (enabled/disabled)
     - Application code inclusion
     - Frame filtering logic and edge cases
+
+    DEBUG is flipped once per class in setUpClass rather than via the
+    override_settings class decorator, which re-dispatches the settings-change
+    signal machinery around every test.
     """
 
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._override = override_settings(DEBUG=True)
+        cls._override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._override.disable()
+        super().tearDownClass()
+
     def setUp(self):
-        connection.queries_log.clear()
+        self._qlog = connection.queries_log
+        self._qlog.clear()
 
     def test_stacktrace_filtering_comprehensive(self):
         """Test that the stacktrace filters out Django framework code."""
@@ -68,9 +83,11 @@ class TestStacktraceFiltering(TestCase):
                 ("/project/tests/test_views.py", True),
             ]
 
+            # Local binding skips the global lookup on every iteration
+            _inc = should_include_frame
             for filename, expected in test_cases:
                 frame = create_mock_frame(filename)
-                result = should_include_frame(frame)
+                result = _inc(frame)
                 self.assertEqual(result, expected, f"For '{filename}', expected {expected}, got {result}")
 
     def test_pytest_executable_filtering(self):
@@ -103,9 +120,10 @@ class TestStacktraceFiltering(TestCase):
 
             all_cases = pytest_executable_cases + pytest_internal_cases
 
+            _inc = should_include_frame
             for filename, expected in all_cases:
                 frame = create_mock_frame(filename)
-                result = should_include_frame(frame)
+                result = _inc(frame)
                 self.assertEqual(result, expected, f"For '{filename}', expected {expected}, got {result}")
 
     def test_django_management_filtering(self):
@@ -128,9 +146,10 @@ class TestStacktraceFiltering(TestCase):
                 ("/path/to/site-packages/django/core/management/commands/shell.py", False),
             ]
 
+            _inc = should_include_frame
             for filename, expected in management_cases:
                 frame = create_mock_frame(filename)
-                result = should_include_frame(frame)
+                result = _inc(frame)
                 self.assertEqual(result, expected, f"For '{filename}', expected {expected}, got {result}")
 
     def test_package_internal_filtering(self):
@@ -158,9 +177,10 @@ class TestStacktraceFiltering(TestCase):
                 ("/path/to/other_package/cursors.py", True),
             ]
 
+            _inc = should_include_frame
             for filename, expected in internal_cases:
                 frame = create_mock_frame(filename)
-                result = should_include_frame(frame)
+                result = _inc(frame)
                 self.assertEqual(result, expected, f"For '{filename}', expected {expected}, got {result}")
 
     def test_shell_execution_filtering(self):
@@ -186,11 +206,35 @@ class TestStacktraceFiltering(TestCase):
             ("console.py", True),
         ]
 
+        _inc = should_include_frame
         for filename, expected in shell_cases:
             frame = create_mock_frame(filename)
-            result = should_include_frame(frame)
+            result = _inc(frame)
             self.assertEqual(result, expected, f"For '{filename}', expected {expected}, got {result}")
 
+    def test_exclude_patterns_compiled_once(self):
+        """Test that the exclude patterns are compiled at import time and reused across calls."""
+        from sql_traceback import filter as filter_module
+        from sql_traceback.filter import should_include_filename
+
+        patterns_before = (
+            filter_module._SITEPACKAGES_EXCLUDE_RE,
+            filter_module._STDLIB_EXCLUDE_RE,
+            filter_module._TESTING_EXCLUDE_RE,
+        )
+
+        for filename in ["/app/views.py", "/path/to/django/db/models.py", "/usr/lib/python3.12/threading.py"]:
+            should_include_filename(filename)
+
+        patterns_after = (
+            filter_module._SITEPACKAGES_EXCLUDE_RE,
+            filter_module._STDLIB_EXCLUDE_RE,
+            filter_module._TESTING_EXCLUDE_RE,
+        )
+
+        for before, after in zip(patterns_before, patterns_after, strict=True):
+            self.assertIs(before, after, "Exclude patterns should not be recompiled per call")
+
     def test_disabled_site_packages_filtering(self):
         """Test behavior when site-packages filtering is disabled."""
         # Test with site-packages filtering disabled
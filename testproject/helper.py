@@ -1,5 +1,7 @@
 from services import get_user_count
 
+from sql_traceback.config import TRACEBACK_ENABLED
+
 
 def layer1():
     """First layer of function calls."""
@@ -14,3 +16,27 @@ def layer2():
 def layer3():
     """Third layer that calls the actual service."""
     return get_user_count()
+
+
+if not TRACEBACK_ENABLED:
+    # With tracing off the layers demonstrate nothing and only add a Python
+    # call each, so collapse them to the service call at import time
+    layer1 = layer2 = layer3 = get_user_count
+
+
+def run_stacktrace_benchmark(iterations=10_000):
+    """Time repeated layer1() calls under sql_traceback().
+
+    Returns the elapsed seconds. Useful for eyeballing the per-query
+    stacktrace overhead after changes to the frame walk or filtering:
+    compare a run against one with SQL_TRACEBACK_ENABLED = False.
+    """
+    import time
+
+    from sql_traceback import sql_traceback
+
+    start = time.perf_counter()
+    with sql_traceback():
+        for _ in range(iterations):
+            layer1()
+    return time.perf_counter() - start